@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for graph_lib's hot paths on locally generated synthetic inputs:
+icosphere meshes at several resolutions, random vertex signals and
+newman_girvan_benchmark graphs.
+
+Each case is timed (minimum and median of several runs) and memory-profiled
+(peak traced allocation of one run). Results are written as JSON, and can be
+compared against a stored baseline:
+
+    python benchmarks/run_benchmarks.py -o new.json
+    python benchmarks/run_benchmarks.py -o new.json --baseline old.json --threshold 0.2
+
+The exit status is 1 if any case raises an error, or if, compared with the
+baseline, any case is slower or uses more memory by more than the threshold,
+starts raising an error, or is missing.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from functools import partial
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WEIGHT_TYPES = (('dissimilar', 'euclidean'), ('dissimilar', 'cityblock'),
+                ('dissimilar', 'correlation'), ('similar', 'pearson correlation'))
+BENCHMARKS = []
+
+
+def benchmark(func):
+    """
+    register a benchmark
+    The function receives the inputs dict and yields (case_name, callable).
+    """
+    BENCHMARKS.append(func)
+    return func
+
+
+# ----------------------------synthetic inputs---------------------------------
+def icosphere(level):
+    """
+    create an icosphere by subdividing an icosahedron's faces
+    :param level: integer
+        the number of subdivisions
+    :return: (coords, faces)
+        coords: array with shape (n_vertices, 3)
+        faces: array with shape (n_triangles, 3)
+    """
+    t = (1 + np.sqrt(5)) / 2
+    coords = [(-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0),
+              (0, -1, t), (0, 1, t), (0, -1, -t), (0, 1, -t),
+              (t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1)]
+    faces = [(0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11),
+             (1, 5, 9), (5, 11, 4), (11, 10, 2), (10, 7, 6), (7, 1, 8),
+             (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8), (3, 8, 9),
+             (4, 9, 5), (2, 4, 11), (6, 2, 10), (8, 6, 7), (9, 8, 1)]
+    coords = [np.array(v) / np.linalg.norm(v) for v in coords]
+
+    for _ in range(level):
+        midpoints = dict()
+
+        def midpoint(i, j):
+            key = (min(i, j), max(i, j))
+            if key not in midpoints:
+                v = coords[i] + coords[j]
+                coords.append(v / np.linalg.norm(v))
+                midpoints[key] = len(coords) - 1
+            return midpoints[key]
+
+        new_faces = []
+        for a, b, c in faces:
+            ab, bc, ca = midpoint(a, b), midpoint(b, c), midpoint(c, a)
+            new_faces.extend([(a, ab, ca), (b, bc, ab), (c, ca, bc), (ab, bc, ca)])
+        faces = new_faces
+
+    return np.array(coords), np.array(faces)
+
+
+def make_inputs(levels, n_time_points, graph_sizes, seed):
+    """
+    create all synthetic inputs with fixed random seeds
+    """
+    from graph_lib.algorithm.generator import newman_girvan_benchmark
+    from graph_lib.tools.mesh_tool import mesh2graph
+
+    np.random.seed(seed)
+    random.seed(seed)
+    inputs = {'meshes': [], 'graphs': [], 'tmp_dir': tempfile.mkdtemp()}
+    for level in levels:
+        coords, faces = icosphere(level)
+        vtx_signal = np.random.randn(len(coords), n_time_points)
+        graph = mesh2graph(faces, vtx_signal=vtx_signal, weight_type=('similar', 'pearson correlation'),
+                           weight_normalization=True)
+        inputs['meshes'].append({'name': 'ico{}'.format(level), 'coords': coords, 'faces': faces,
+                                 'vtx_signal': vtx_signal, 'graph': graph})
+    for n_vtx in graph_sizes:
+        graph = newman_girvan_benchmark(n_vtx, 4, 6, 2)
+        edgelist = os.path.join(inputs['tmp_dir'], 'ng{}.txt'.format(n_vtx))
+        with open(edgelist, 'w') as f:
+            f.writelines('{} {}\n'.format(u, v) for u, v in graph.edges())
+        inputs['graphs'].append({'name': 'ng{}'.format(n_vtx), 'graph': graph, 'edgelist': edgelist})
+    return inputs
+
+
+# ----------------------------benchmarks---------------------------------
+@benchmark
+def bench_mesh_tool(inputs):
+    from graph_lib.tools.mesh_tool import get_n_ring_neighbor, mesh2edge_list, mesh2graph
+
+    for mesh in inputs['meshes']:
+        faces, vtx_signal = mesh['faces'], mesh['vtx_signal']
+        for n in (1, 2, 3):
+            yield ('get_n_ring_neighbor[{}-n{}]'.format(mesh['name'], n),
+                   partial(get_n_ring_neighbor, faces, n))
+        for weight_type in WEIGHT_TYPES:
+            yield ('mesh2edge_list[{}-{}-{}]'.format(mesh['name'], *weight_type),
+                   partial(mesh2edge_list, faces, 2, False, vtx_signal, weight_type, True))
+        yield ('mesh2graph[{}]'.format(mesh['name']),
+               partial(mesh2graph, faces, 2, False, vtx_signal, ('dissimilar', 'euclidean'), True))
+
+
+@benchmark
+def bench_segmentation(inputs):
+    from graph_lib.algorithm.utility import DW_matrices
+    from graph_lib.algorithm.segmentation import two_ncut, graph2parcel, graph_ncut_thr
+
+    for mesh in inputs['meshes']:
+        graph = mesh['graph']
+        yield 'DW_matrices[{}]'.format(mesh['name']), partial(DW_matrices, graph)
+        yield 'two_ncut[{}]'.format(mesh['name']), partial(two_ncut, graph, 10)
+        yield 'graph2parcel[{}]'.format(mesh['name']), partial(graph2parcel, graph, 8, in_place=False)
+        yield 'graph_ncut_thr[{}]'.format(mesh['name']), partial(graph_ncut_thr, graph, in_place=False)
+
+
+@benchmark
+def bench_underlying_graph_analysis(inputs):
+    from graph_lib.algorithm.underlying_graph_analysis import get_distance, get_distribution
+
+    for item in inputs['graphs']:
+        graph = item['graph']
+        yield 'get_distance[{}]'.format(item['name']), partial(get_distance, graph)
+        for target in ('degree', 'cc'):
+            yield ('get_distribution[{}-{}]'.format(item['name'], target),
+                   partial(get_distribution, graph, target))
+
+
+@benchmark
+def bench_io(inputs):
+    from graph_lib.io.text_io import read_edgelist
+
+    for item in inputs['graphs']:
+        yield 'read_edgelist[{}]'.format(item['name']), partial(read_edgelist, item['edgelist'])
+
+
+# ----------------------------run and compare---------------------------------
+def measure(func, repeat):
+    """
+    time func repeat times, and trace its peak memory in a separate run
+    :return: dict
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # tracing slows the function down, so it isn't mixed with timing
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'time_min': min(times), 'time_median': float(np.median(times)),
+            'peak_memory': peak, 'error': None}
+
+
+def run(inputs, repeat, pattern=None):
+    results = dict()
+    for bench in BENCHMARKS:
+        try:
+            cases = list(bench(inputs))
+        except Exception as err:
+            # e.g. an optional dependency is missing
+            results[bench.__name__] = {'error': '{}: {}'.format(type(err).__name__, err)}
+            print('{:<60} ERROR {}'.format(bench.__name__, results[bench.__name__]['error']))
+            continue
+        for name, func in cases:
+            if pattern is not None and pattern not in name:
+                continue
+            try:
+                results[name] = measure(func, repeat)
+            except Exception as err:
+                results[name] = {'error': '{}: {}'.format(type(err).__name__, err)}
+                print('{:<60} ERROR {}'.format(name, results[name]['error']))
+            else:
+                print('{:<60} {:>10.4f}s {:>12.1f}KiB'.format(name, results[name]['time_min'],
+                                                          results[name]['peak_memory'] / 1024.))
+    return results
+
+
+def compare(results, baseline, threshold, pattern=None):
+    """
+    compare results against baseline
+    :param pattern: string
+        Baseline cases whose name doesn't contain the pattern weren't run, so they aren't compared.
+    :return: list
+        names of the cases which regress by more than threshold,
+        raise an error while they didn't in the baseline, or are missing from results
+    """
+    regressions = []
+    for name in sorted(baseline):
+        if pattern is not None and pattern not in name:
+            continue
+        old = baseline[name]
+        new = results.get(name)
+        if new is None:
+            if not old.get('error'):
+                regressions.append(name)
+                print('{:<60} MISSING'.format(name))
+            continue
+        if new.get('error'):
+            if not old.get('error'):
+                regressions.append(name)
+                print('{:<60} ERROR {}'.format(name, new['error']))
+            continue
+        if old.get('error'):
+            continue
+        time_ratio = new['time_min'] / old['time_min']
+        mem_ratio = float(new['peak_memory']) / max(1, old['peak_memory'])
+        flag = ''
+        if time_ratio > 1 + threshold or mem_ratio > 1 + threshold:
+            regressions.append(name)
+            flag = 'REGRESSION'
+        print('{:<60} time x{:<8.3f} memory x{:<8.3f} {}'.format(name, time_ratio, mem_ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', default='bench_results.json',
+                        help='the path of the JSON file to write results into')
+    parser.add_argument('--baseline', help='the JSON file of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='the allowed relative slowdown or memory growth')
+    parser.add_argument('--levels', type=int, nargs='+', default=[2, 3, 4],
+                        help='icosphere subdivision levels')
+    parser.add_argument('--graph-sizes', type=int, nargs='+', default=[128, 512],
+                        help='the numbers of vertices of newman_girvan_benchmark graphs')
+    parser.add_argument('--time-points', type=int, default=50,
+                        help='the number of time points of the random vertex signal')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-k', '--pattern', help='only run cases whose name contains the pattern')
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.levels, args.time_points, args.graph_sizes, args.seed)
+    try:
+        results = run(inputs, args.repeat, args.pattern)
+    finally:
+        shutil.rmtree(inputs['tmp_dir'])
+
+    meta = {'python': platform.python_version(), 'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'args': vars(args)}
+    for module in ('numpy', 'scipy', 'networkx'):
+        meta[module] = __import__(module).__version__
+    with open(args.output, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold, args.pattern)
+        if regressions:
+            print('{} case(s) regressed by more than {:.0%}, raised errors or are missing'.format(
+                len(regressions), args.threshold))
+            sys.exit(1)
+
+    errors = sorted(name for name, result in results.items() if result.get('error'))
+    if errors:
+        print('{} case(s) raised errors: {}'.format(len(errors), ', '.join(errors)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Compare graph2parcel on a dense n ring graph with that on its sparsified version,
+which keeps each vertex's top_k most similar neighbors.
+
+The signal consists of square regions, each of which shares a time course,
+plus noise. Sparsification speeds graph2parcel up when the dense neighborhood
+is large and such regions exist. For structureless signals, fewer edges can make
+the eigensolver need more iterations, so that it may even be slower.
+"""
+import time
+import numpy as np
+
+from graph_lib.tools.mesh_tool import mesh2graph
+from graph_lib.algorithm.segmentation import graph2parcel
+
+# ----------------------create a grid mesh with regional signal-----------------------------
+np.random.seed(0)
+n_side = 60
+n_region = 4  # the number of regions along each side
+n_time_point = 20
+vtx_ids = np.arange(n_side * n_side).reshape(n_side, n_side)
+faces = np.r_[np.c_[vtx_ids[:-1, :-1].ravel(), vtx_ids[1:, :-1].ravel(), vtx_ids[:-1, 1:].ravel()],
+              np.c_[vtx_ids[1:, :-1].ravel(), vtx_ids[1:, 1:].ravel(), vtx_ids[:-1, 1:].ravel()]]
+region_ids = np.arange(n_side) // (n_side // n_region)
+region_ids = (region_ids[:, None] * n_region + region_ids[None, :]).ravel()
+region_signal = np.random.randn(n_region * n_region, n_time_point)
+vtx_signal = region_signal[region_ids] + 0.3 * np.random.randn(n_side * n_side, n_time_point)
+weight_type = ('similar', 'pearson correlation')
+
+# ----------------------dense graph-----------------------------
+graph = mesh2graph(faces, n=5, vtx_signal=vtx_signal,
+                   weight_type=weight_type, weight_normalization=True)
+start = time.time()
+graph2parcel(graph, n=8)
+dense_time = time.time() - start
+
+# ----------------------sparsified graph-----------------------------
+stats = dict()
+graph = mesh2graph(faces, n=5, vtx_signal=vtx_signal,
+                   weight_type=weight_type, weight_normalization=True, top_k=10, stats=stats)
+start = time.time()
+graph2parcel(graph, n=8)
+sparse_time = time.time() - start
+
+print('kept {:.1%} of {} edges'.format(stats['kept_fraction'], stats['n_edge']))
+print('graph2parcel: {:.2f}s (dense) vs {:.2f}s (sparse), speedup {:.2f}x'.format(
+    dense_time, sparse_time, dense_time / sparse_time))
@@ -5,6 +5,9 @@ from scipy.sparse import linalg
 from skimage.future.graph import _ncut_cy
 from skimage.future.graph.graph_cut import partition_by_cut, get_min_ncut, cut_normalized
 
+from graph_lib import instrument
+from graph_lib.algorithm.utility import DW_matrices
+
 
 # ------------------------------about normalized cut--------------------------------------
 def two_ncut(graph, num_cuts):
@@ -25,33 +28,48 @@ def two_ncut(graph, num_cuts):
     (nx.Graph, None) : the first element is the graph itself
         This means the graph can't be further sub-divided.
     """
-    d, w = DW_matrices(graph)
-    m = w.shape[0]
-
-    if m > 2:
-        d2 = d.copy()
-        # Since d is diagonal, we can directly operate on its data
-        # the inverse of the square root
-        d2.data = np.reciprocal(np.sqrt(d2.data, out=d2.data), out=d2.data)
-
-        # Refer Shi & Malik 2001, Equation 7, Page 891
-        vals, vectors = linalg.eigsh(d2 * (d - w) * d2, which='SM',
-                                     k=min(100, m - 2))
-
-        # Pick second smallest eigenvector.
-        # Refer Shi & Malik 2001, Section 3.2.3, Page 893
-        vals, vectors = np.real(vals), np.real(vectors)
-        index2 = _ncut_cy.argmin2(vals)
-        ev = vectors[:, index2]
-
-        cut_mask, mcut = get_min_ncut(ev, d, w, num_cuts)
-
-        if mcut != np.inf:
-            # Sub divide and perform N-cut again
-            # Refer Shi & Malik 2001, Section 3.2.5, Page 893
-            sub1, sub2 = partition_by_cut(cut_mask, graph)
-
-            return sub1, sub2
+    with instrument.stage('two_ncut') as cut_stage:
+        if instrument.enabled():
+            # number_of_edges() walks all nodes, so it is only paid for when recording
+            cut_stage.update(n_node=graph.number_of_nodes(), n_edge=graph.number_of_edges())
+        with instrument.stage('DW_matrices'):
+            d, w = DW_matrices(graph)
+        m = w.shape[0]
+
+        if m > 2:
+            d2 = d.copy()
+            # Since d is diagonal, we can directly operate on its data
+            # the inverse of the square root
+            d2.data = np.reciprocal(np.sqrt(d2.data, out=d2.data), out=d2.data)
+
+            # Refer Shi & Malik 2001, Equation 7, Page 891
+            with instrument.stage('eigsh') as eig_stage:
+                a = d2 * (d - w) * d2
+                if instrument.enabled():
+                    a, counter = instrument.counted_operator(a)
+                vals, vectors = linalg.eigsh(a, which='SM', k=min(100, m - 2))
+                if instrument.enabled():
+                    eig_stage.update(n_matvec=counter[0])
+
+            # Pick second smallest eigenvector.
+            # Refer Shi & Malik 2001, Section 3.2.3, Page 893
+            vals, vectors = np.real(vals), np.real(vectors)
+            index2 = _ncut_cy.argmin2(vals)
+            ev = vectors[:, index2]
+
+            with instrument.stage('get_min_ncut') as ncut_stage:
+                cut_mask, mcut = get_min_ncut(ev, d, w, num_cuts)
+                ncut_stage.update(mcut=float(mcut))
+
+            if mcut != np.inf:
+                # Sub divide and perform N-cut again
+                # Refer Shi & Malik 2001, Section 3.2.5, Page 893
+                with instrument.stage('partition_by_cut'):
+                    sub1, sub2 = partition_by_cut(cut_mask, graph)
+                cut_stage.update(sub_sizes=[sub1.number_of_nodes(), sub2.number_of_nodes()])
+
+                return sub1, sub2
+        cut_stage.update(sub_sizes=None)
     return graph, None
 
 
@@ -94,16 +112,17 @@ def graph2parcel(graph, n=2, num_cuts=10, in_place=True, max_edge=1.0):
     # normalized cut begins
     subgraphs = [graph]
     min_parcels = []
-    while len(subgraphs)+len(min_parcels) < n and subgraphs:
-        subgraphs.sort(key=lambda x: x.number_of_nodes(), reverse=True)
-        subgraph = subgraphs.pop(0)
-        sub1, sub2 = two_ncut(subgraph, num_cuts)
-        if sub2 is None:
-            min_parcels.append(sub1)
-        else:
-            subgraphs.extend([sub1, sub2])
+    with instrument.stage('graph2parcel', n_node=graph.number_of_nodes(), n_parcel=n):
+        while len(subgraphs)+len(min_parcels) < n and subgraphs:
+            subgraphs.sort(key=lambda x: x.number_of_nodes(), reverse=True)
+            subgraph = subgraphs.pop(0)
+            sub1, sub2 = two_ncut(subgraph, num_cuts)
+            if sub2 is None:
+                min_parcels.append(sub1)
+            else:
+                subgraphs.extend([sub1, sub2])
     if not subgraphs:
-        print 'The graph can not be further sub-divided!'
+        print('The graph can not be further sub-divided!')
 
     # assign labels for each parcel & find neighbor parcels
     node_neighbors = list()
@@ -121,7 +140,7 @@ def graph2parcel(graph, n=2, num_cuts=10, in_place=True, max_edge=1.0):
             node_neighbors[label].update(edge_dict[node].keys())
         node_neighbors[label].difference_update(parcel.nodes())  # remove the parcel's own nodes
     # transform node to parcel label
-    parcel_neighbors = [map(lambda x: graph.node[x]['label'], nodes) for nodes in node_neighbors]
+    parcel_neighbors = [[graph.node[x]['label'] for x in nodes] for nodes in node_neighbors]
     parcel_neighbors = [np.unique(parcels) for parcels in parcel_neighbors]
 
     return graph, parcel_neighbors
@@ -167,7 +186,8 @@ def graph_ncut_thr(graph, thresh=0.001, num_cuts=10, in_place=True, max_edge=1.0
         graph.node[node]['labels'] = [label]
 
     labels = np.array(range(graph.number_of_nodes()))
-    labels = cut_normalized(labels, graph, thresh=thresh,
-                            num_cuts=num_cuts, in_place=in_place, max_edge=max_edge)
+    with instrument.stage('cut_normalized', n_node=graph.number_of_nodes(), thresh=thresh):
+        labels = cut_normalized(labels, graph, thresh=thresh,
+                                num_cuts=num_cuts, in_place=in_place, max_edge=max_edge)
 
     return labels
@@ -41,7 +41,7 @@ def get_distribution(graph, target, y_type='frequency'):
         dictionary = get_distance(graph)
     else:
         raise ValueError('The {} is not a supported target at present.'.format(target))
-    sequence = dictionary.values()
+    sequence = list(dictionary.values())
     seq = sorted(np.unique(sequence))
 
     # calculate the distribution
@@ -2,7 +2,6 @@ import numpy as np
 from networkx import to_scipy_sparse_matrix
 from scipy.sparse import dia_matrix
 
-
 # ---------------------------get information from graph-----------------------------------
 def DW_matrices(graph):
     """
@@ -38,11 +37,198 @@ def node_attr2array(graph, attrs):
         nodes' attributes which are going to be saved
     :return: numpy array
         each row_index represents a node; each column represent a nodes' attribute.
+        The row index is equal to the node, so nodes must be non-negative integers.
+        Rows of integers which aren't nodes, and nodes without an attribute, are NaN.
+    """
+    nodes = graph.nodes()
+    rows = np.array(nodes)
+    if len(rows) and (rows.dtype.kind not in 'iu' or rows.min() < 0):
+        raise ValueError("Nodes should be non-negative integers, which are used as row indices!")
+    arrays, _ = node_attrs2arrays(graph, attrs, nodes, dtypes=dict.fromkeys(attrs, np.float64))
+    arr = np.full((rows.max() + 1 if len(rows) else 0, len(attrs)), np.nan)
+    for idx, attr in enumerate(attrs):
+        arr[rows, idx] = arrays[attr].filled(np.nan)
+    return arr
+
+
+def _default_fill(dtype):
+    """
+    get the value used for missing attributes according to the dtype
+    """
+    kind = np.dtype(dtype).kind
+    if kind in 'fc':
+        return np.nan
+    elif kind in 'iu':
+        return 0
+    elif kind == 'b':
+        return False
+    elif kind in 'SU':
+        return ''
+    else:
+        return None
+
+
+def _infer_array(values):
+    """
+    convert the values into a 1D array with the dtype inferred by numpy
+    :return: numpy array or None
+        None if the values can't be held by a 1D array with a non-object dtype,
+        such as sequences
     """
-    n_vtx = graph.number_of_nodes()
-    arr_shape = (n_vtx, len(attrs))
-    arr = np.zeros(arr_shape)
-    for node, data in graph.nodes_iter(data=True):
-        for idx, attr in enumerate(attrs):
-            arr[node, idx] = data[attr]
+    try:
+        arr = np.asarray(values)
+    except ValueError:
+        # sequences of different lengths
+        return None
+    if arr.ndim != 1 or arr.dtype.kind == 'O':
+        return None
     return arr
+
+
+def node_attrs2arrays(graph, attrs, nodes=None, dtypes=None, fill_value=None, structured=False):
+    """
+    extract several nodes' attributes into typed numpy arrays at once
+
+    Parameters
+    ----------
+    graph : nx.Graph
+    attrs : sequence (e.g. ('ncut label', 'color'))
+        nodes' attributes which are going to be extracted
+    nodes : sequence
+        nodes whose attributes are extracted. Its order decides the arrays' row order.
+        If it is None, use sorted(graph.nodes()).
+    dtypes : dict
+        map an attribute to a numpy dtype.
+        The dtype of an attribute which is not in the dict is inferred by numpy
+        from the nodes which have the attribute.
+    fill_value : scalar or dict
+        the value used for nodes which don't have the attribute.
+        A dict maps an attribute to its own fill value, and a scalar is used for all attributes.
+        An attribute without a given fill value is filled according to its dtype:
+        NaN for floats, 0 for integers, False for booleans, '' for strings and None for objects.
+        Objects, such as lists, are held by 1D arrays with dtype object.
+    structured : bool
+        If it is False, return a dict of 1D arrays.
+        If it is True, return a structured array whose fields are the attributes.
+
+    Returns
+    -------
+    arrays : dict or structured array
+        attribute -> 1D masked array whose i_th element belongs to nodes[i].
+        Elements of nodes which don't have the attribute are masked,
+        and their underlying data (np.ma.getdata) is the fill value.
+        NOTE: numpy can't use None as a masked array's fill_value, so filled()
+        of an object array doesn't return None for masked elements.
+    node2idx : dict
+        node -> row index in the arrays
+    """
+    if nodes is None:
+        nodes = sorted(graph.nodes())
+    else:
+        nodes = list(nodes)
+    if dtypes is None:
+        dtypes = dict()
+    if not isinstance(fill_value, dict):
+        fill_value = dict() if fill_value is None else dict.fromkeys(attrs, fill_value)
+    node_dict = graph.node
+    # look up each node's attribute dict only once
+    data_list = [node_dict[node] for node in nodes]
+    n_node = len(nodes)
+
+    arrays = dict()
+    for attr in attrs:
+        # the mask is only built if some nodes don't have the attribute
+        complete = all(attr in data for data in data_list)
+        dtype = dtypes.get(attr)
+        arr = None
+        if dtype is None:
+            # infer the dtype from existing values only, so that fill values don't affect it
+            if complete:
+                arr = _infer_array([data[attr] for data in data_list])
+            else:
+                arr = _infer_array([data[attr] for data in data_list if attr in data])
+            if arr is None:
+                dtype = object
+            else:
+                # the array is empty if no node has the attribute
+                dtype = arr.dtype if len(arr) else np.float64
+                if not complete:
+                    arr = None
+        fill = fill_value.get(attr, _default_fill(dtype))
+        kind = np.dtype(dtype).kind
+
+        if arr is not None:
+            # the inferred array holds all nodes' values already
+            pass
+        elif kind in 'biufc':
+            # fromiter fills the array in a single pass without an intermediate list
+            arr = np.fromiter((data.get(attr, fill) for data in data_list), dtype, n_node)
+        elif kind == 'O':
+            # element-wise assignment keeps sequences as elements of a 1D array
+            arr = np.empty(n_node, object)
+            for idx, data in enumerate(data_list):
+                arr[idx] = data.get(attr, fill)
+        elif attr not in dtypes:
+            # let numpy widen the inferred string length to hold the fill value
+            arr = np.array([data.get(attr, fill) for data in data_list])
+        else:
+            arr = np.array([data.get(attr, fill) for data in data_list], dtype)
+
+        if complete:
+            mask = np.ma.nomask
+        else:
+            mask = np.fromiter((attr not in data for data in data_list), bool, n_node)
+        arrays[attr] = np.ma.MaskedArray(arr, mask, fill_value=None if kind == 'O' else fill)
+
+    if structured:
+        struct_dtype = [(str(attr), arrays[attr].dtype) for attr in attrs]
+        struct_arr = np.ma.empty(n_node, struct_dtype)
+        for attr in attrs:
+            struct_arr[str(attr)] = arrays[attr]
+        arrays = struct_arr
+
+    node2idx = dict(zip(nodes, range(n_node)))
+    return arrays, node2idx
+
+
+def arrays2node_attrs(graph, arrays, nodes=None):
+    """
+    write attribute arrays back onto the graph's nodes in bulk
+    It is the reverse of node_attrs2arrays.
+
+    Parameters
+    ----------
+    graph : nx.Graph
+    arrays : dict or structured array
+        attribute -> 1D array whose i_th element belongs to nodes[i]
+        Masked elements aren't written, so nodes which didn't have
+        the attribute in node_attrs2arrays still don't have it.
+    nodes : sequence or dict
+        nodes which the arrays' rows belong to.
+        A dict is regarded as a node2idx mapping returned by node_attrs2arrays.
+        If it is None, use sorted(graph.nodes()).
+
+    Returns
+    -------
+    graph : nx.Graph
+        the graph itself, modified in place
+    """
+    if nodes is None:
+        nodes = sorted(graph.nodes())
+    elif isinstance(nodes, dict):
+        nodes = sorted(nodes, key=nodes.get)
+    if isinstance(arrays, np.ndarray):
+        arrays = dict((attr, arrays[attr]) for attr in arrays.dtype.names)
+
+    node_dict = graph.node
+    data_list = [node_dict[node] for node in nodes]
+    for attr, arr in arrays.items():
+        if len(arr) != len(data_list):
+            raise ValueError("The length of {}'s array doesn't match the number of nodes!".format(attr))
+        mask = np.ma.getmaskarray(arr)
+        # tolist() converts numpy scalars to python objects in one pass
+        for data, value, masked in zip(data_list, np.ma.getdata(arr).tolist(), mask.tolist()):
+            if not masked:
+                data[attr] = value
+
+    return graph
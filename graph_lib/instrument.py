@@ -0,0 +1,210 @@
+# opt-in instrumentation for the segmentation and mesh pipelines
+import json
+import time
+import tracemalloc
+
+from scipy.sparse.linalg import aslinearoperator, LinearOperator
+
+# recorders which are active at present
+_recorders = []
+
+
+class Recorder(object):
+    """
+    Record an event for each stage run within the context.
+    Each event is a dict including at least:
+        'stage': the stage's name
+        'depth': the number of stages the stage is nested in
+        'start': the time (seconds since the epoch) when the stage starts
+        'wall_time': the seconds the stage takes
+        'peak_memory': the peak traced memory (bytes) during the stage,
+            None if trace_memory is False
+    and extra information supplied by the stage, such as subgraphs' sizes.
+
+    Example
+    -------
+    >>> with Recorder(trace_memory=True) as recorder:
+    ...     graph2parcel(graph, n=10)
+    >>> recorder.summary()
+    """
+
+    def __init__(self, callback=None, trace_memory=False):
+        """
+        :param callback: callable
+            It is called with each event as soon as its stage is finished,
+            which can be used to stream events into monitoring systems.
+        :param trace_memory: bool
+            If true, trace peak memory by tracemalloc, which slows the stages down.
+            If tracemalloc has been started by others, its peak isn't reset,
+            so a stage's peak_memory is the peak since then rather than within the stage.
+        """
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.events = []
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        _recorders.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _recorders.remove(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    def record(self, event):
+        self.events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def summary(self):
+        """
+        aggregate events by stage
+        :return: dict
+            stage -> {'count': integer, 'wall_time': total seconds, 'peak_memory': maximal bytes}
+        """
+        result = dict()
+        for event in self.events:
+            item = result.setdefault(event['stage'], {'count': 0, 'wall_time': 0.0, 'peak_memory': None})
+            item['count'] += 1
+            item['wall_time'] += event['wall_time']
+            if event['peak_memory'] is not None:
+                item['peak_memory'] = max(item['peak_memory'] or 0, event['peak_memory'])
+        return result
+
+    def dump(self, fpath):
+        """
+        save events into a file as JSON lines
+        :param fpath: string
+            the path of the file
+        """
+        with open(fpath, 'w') as f:
+            for event in self.events:
+                f.write(json.dumps(event, default=_json_default) + '\n')
+
+
+def _json_default(obj):
+    # numpy scalars
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError('{} is not JSON serializable'.format(type(obj)))
+
+
+class _Stage(object):
+
+    _stack = []
+
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+        self._peak = 0
+        # leave tracemalloc alone unless a recorder asked for it,
+        # and only reset its peak if the recorder started it
+        self._trace = any(recorder.trace_memory for recorder in _recorders) and tracemalloc.is_tracing()
+        self._reset = self._trace and any(recorder._started_tracing for recorder in _recorders)
+
+    def update(self, **info):
+        """
+        add information to the stage's event
+        """
+        self.info.update(info)
+
+    def __enter__(self):
+        if self._reset and hasattr(tracemalloc, 'reset_peak'):
+            peak = tracemalloc.get_traced_memory()[1]
+            if self._stack:
+                # hand the peak so far over to the outer stage before resetting it
+                self._stack[-1]._peak = max(self._stack[-1]._peak, peak)
+            tracemalloc.reset_peak()
+        self._depth = len(self._stack)
+        self._stack.append(self)
+        self._start = time.time()
+        self._clock = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        wall_time = time.perf_counter() - self._clock
+        self._stack.pop()
+        peak = None
+        if self._trace:
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                self._stack[-1]._peak = max(self._stack[-1]._peak, peak)
+
+        event = {'stage': self.name, 'depth': self._depth, 'start': self._start,
+                 'wall_time': wall_time, 'peak_memory': peak}
+        if exc_type is not None:
+            event['error'] = exc_type.__name__
+        event.update(self.info)
+        for recorder in _recorders:
+            recorder.record(event)
+        return False
+
+
+class _NullStage(object):
+    """
+    the stage used when no recorder is active, which does nothing
+    """
+
+    def update(self, **info):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enabled():
+    """
+    :return: bool
+        True if any recorder is active
+    """
+    return bool(_recorders)
+
+
+def stage(name, **info):
+    """
+    create a context in which a stage runs
+    It costs only a list check if no recorder is active.
+    :param name: string
+        the stage's name
+    :param info: keyword arguments
+        information added to the stage's event
+    :return: context manager
+        Its update() method adds more information to the event.
+    """
+    if not _recorders:
+        return _NULL_STAGE
+    return _Stage(name, info)
+
+
+def counted_operator(matrix):
+    """
+    wrap a matrix into a linear operator which counts matrix-vector products,
+    the number of which measures the iterations of iterative eigensolvers
+    :param matrix: sparse matrix or array
+    :return: (LinearOperator, list)
+        The list's only element is the number of products so far.
+    """
+    operator = aslinearoperator(matrix)
+    counter = [0]
+
+    def matvec(v):
+        counter[0] += 1
+        return operator.matvec(v)
+
+    def matmat(m):
+        counter[0] += m.shape[1]
+        return operator.matmat(m)
+
+    return LinearOperator(operator.shape, matvec=matvec, matmat=matmat, dtype=operator.dtype), counter
@@ -0,0 +1,45 @@
+# io functions for binary files
+import numpy as np
+
+# one record per edge
+EDGE_DTYPE = np.dtype([('row', np.int64), ('col', np.int64), ('weight', np.float64)])
+
+
+def write_edge_chunks(fpath, edge_chunks):
+    """
+    save edges into a binary file chunk by chunk
+    :param fpath: string
+        the path of the binary file
+    :param edge_chunks: iterable
+        each element is (rows, cols, weights), such as the chunks generated by
+        graph_lib.tools.mesh_tool.mesh2edge_chunks
+    :return: integer
+        the number of edges written
+    """
+    n_edge = 0
+    with open(fpath, 'wb') as f:
+        for rows, cols, weights in edge_chunks:
+            records = np.empty(len(rows), EDGE_DTYPE)
+            records['row'] = rows
+            records['col'] = cols
+            records['weight'] = weights
+            records.tofile(f)
+            n_edge += len(records)
+    return n_edge
+
+
+def read_edge_binary(fpath, mmap=False):
+    """
+    read edges from the binary file written by write_edge_chunks
+    :param fpath: string
+        the path of the binary file
+    :param mmap: bool
+        If true, memory-map the file instead of reading it into memory.
+    :return: (rows, cols, weights)
+        numpy arrays
+    """
+    if mmap:
+        records = np.memmap(fpath, dtype=EDGE_DTYPE, mode='r')
+    else:
+        records = np.fromfile(fpath, dtype=EDGE_DTYPE)
+    return records['row'], records['col'], records['weight']
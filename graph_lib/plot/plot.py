@@ -1,10 +1,77 @@
 import numpy as np
 from numpy import polyfit
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+
+
+def _bin_edges(values, bins, log_scale=False):
+    """
+    get bins+1 edges which cover the values evenly in linear or log space
+    """
+    values = np.asarray(values)
+    if log_scale:
+        values = values[values > 0]
+    if values.size == 0:
+        raise ValueError('There are no {}values to bin!'.format('positive ' if log_scale else ''))
+    v_min, v_max = np.min(values), np.max(values)
+    if log_scale:
+        v_min, v_max = np.log10(v_min), np.log10(v_max)
+    if v_min == v_max:
+        # avoid degenerate edges
+        v_min, v_max = v_min - 0.5, v_max + 0.5
+    edges = np.linspace(v_min, v_max, bins + 1)
+    return 10 ** edges if log_scale else edges
+
+
+def _positive(x, y):
+    """
+    remove the pairs which can't be shown in log space
+    """
+    mask = (x > 0) & (y > 0)
+    return x[mask], y[mask]
+
+
+def bin2d(x, y, bins=100, log_scale=False):
+    """
+    count the points (x, y) in a bins x bins grid
+    :param x: sequence
+    :param y: sequence
+    :param bins: integer
+        the number of bins along each axis
+    :param log_scale: bool
+        If true, bins are even in log space, and non-positive points are ignored.
+    :return: (counts, x_edges, y_edges)
+        counts: array with shape (bins, bins), counts[i, j] is the number of points
+            whose x is in [x_edges[i], x_edges[i+1]) and y is in [y_edges[j], y_edges[j+1])
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if log_scale:
+        x, y = _positive(x, y)
+    x_edges = _bin_edges(x, bins, log_scale)
+    y_edges = _bin_edges(y, bins, log_scale)
+    counts, _, _ = np.histogram2d(x, y, [x_edges, y_edges])
+    return counts, x_edges, y_edges
+
+
+def _bin_mean(x, y, bins, log_scale=False):
+    """
+    bin x and average x and y within each nonempty bin
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if log_scale:
+        x, y = _positive(x, y)
+    edges = _bin_edges(x, bins, log_scale)
+    idx = np.digitize(x, edges[1:-1])
+    counts = np.bincount(idx, minlength=bins)
+    nonempty = counts > 0
+    counts = counts[nonempty]
+    x_mean = np.bincount(idx, x, bins)[nonempty] / counts
+    y_mean = np.bincount(idx, y, bins)[nonempty] / counts
+    return x_mean, y_mean
 
 
 def plot2d(x, y, style='normal',
-           title='', xlabel='', ylabel='', save_path=None, grid=False, **kwargs):
+           title='', xlabel='', ylabel='', save_path=None, grid=False, bins=None, **kwargs):
     """
     package the plot steps
     :param x: sequence
@@ -19,8 +86,15 @@ def plot2d(x, y, style='normal',
     :param grid: bool
         If true, it displays grid line.
         If false, it doesn't display grid line.
+    :param bins: integer
+        If it is not None, x is divided into bins bins (even in log space for 'loglog'),
+        and the mean of each nonempty bin is plotted instead of all points.
+        So the plot's cost doesn't depend on the number of points.
     :param kwargs: keyword arguments for plt.plot
     """
+    if bins is not None:
+        x, y = _bin_mean(x, y, bins, log_scale=(style == 'loglog'))
+
     if style == 'normal':
         plt.plot(x, y, **kwargs)
     elif style == 'loglog':
@@ -41,10 +115,13 @@ def plot2d(x, y, style='normal',
 
 
 def scatter2d(x, y, radius_min=3, radius_max=10, marker='o', color='b', alpha=0.5,
-              title='', xlabel='', ylabel='', save_path=None, grid=False):
+              title='', xlabel='', ylabel='', save_path=None, grid=False,
+              density=None, bins=100, log_scale=False, cmap='viridis'):
     """
     Plot a scatter diagram, and points's size in the diagram are weighted by their counts.
     Bigger the count is, bigger the point will be.
+    For millions of points, use a density mode, whose cost and file size don't depend on
+    the number of points.
     :param x: sequence
     :param y: sequence
     :param radius_min: number
@@ -70,22 +147,47 @@ def scatter2d(x, y, radius_min=3, radius_max=10, marker='o', color='b', alpha=0.
     :param grid: bool
         If true, it displays grid line.
         If false, it doesn't display grid line.
+    :param density: string
+        None: plot each unique point
+        'hist2d': plot a bins x bins 2D histogram as a rasterized image
+        'hexbin': plot a hexagonal binning with bins hexagons along x
+        The counts are colored in log scale.
+    :param bins: integer
+        the number of bins along x for density modes
+    :param log_scale: bool
+        If true, use log axes and bins even in log space. Non-positive points are ignored.
+    :param cmap: string
+        the colormap for density modes
     :return:
     """
     if radius_max < radius_min:
         raise ValueError('Radius_max should be larger than radius_min!')
 
-    points = list(zip(x, y))
-    points_uniq = set(zip(x, y))
-    x_uniq, y_uniq, points_count = [], [], []
-    for point in points_uniq:
-        x_uniq.append(point[0])
-        y_uniq.append(point[1])
-        points_count.append(points.count(point))
-    max_count = max(points_count)
-    radius_increment = radius_max - radius_min
-    points_area = [np.pi*(count/max_count*radius_increment+radius_min)**2 for count in points_count]
-    plt.scatter(x_uniq, y_uniq, s=points_area, marker=marker, alpha=alpha, c=color)
+    if density is None:
+        points = np.c_[np.asarray(x), np.asarray(y)]
+        points_uniq, points_count = np.unique(points, axis=0, return_counts=True)
+        max_count = np.max(points_count)
+        radius_increment = radius_max - radius_min
+        points_area = np.pi * (points_count/max_count*radius_increment+radius_min) ** 2
+        plt.scatter(points_uniq[:, 0], points_uniq[:, 1], s=points_area, marker=marker, alpha=alpha, c=color)
+    elif density == 'hist2d':
+        counts, x_edges, y_edges = bin2d(x, y, bins, log_scale)
+        # empty bins are left blank
+        counts = np.ma.masked_equal(counts, 0)
+        plt.pcolormesh(x_edges, y_edges, counts.T, cmap=cmap, norm=LogNorm(), rasterized=True)
+        plt.colorbar(label='count')
+    elif density == 'hexbin':
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        if log_scale:
+            x, y = _positive(x, y)
+        scale = 'log' if log_scale else 'linear'
+        plt.hexbin(x, y, gridsize=bins, bins='log', mincnt=1, xscale=scale, yscale=scale, cmap=cmap)
+        plt.colorbar(label='log10(count)')
+    else:
+        raise ValueError('The density {} is not supported at present!'.format(density))
+    if log_scale:
+        plt.xscale('log')
+        plt.yscale('log')
 
     ax = plt.gca()
     ax.spines['top'].set_color('none')
@@ -100,7 +202,8 @@ def scatter2d(x, y, radius_min=3, radius_max=10, marker='o', color='b', alpha=0.
 
 
 def polyfit2d(x, y, deg,
-              title='', xlabel='', ylabel='', save_path=None, grid=False, **kwargs):
+              title='', xlabel='', ylabel='', save_path=None, grid=False,
+              bins=None, log_scale=False, **kwargs):
     """
     do polyfit for two sequence and plot the fit curve
     :param x: array_like, shape (M,)
@@ -117,10 +220,27 @@ def polyfit2d(x, y, deg,
     :param grid: bool
         If true, it displays grid line.
         If false, it doesn't display grid line.
-    :param kwargs: key words for plot2d
+    :param bins: integer
+        If it is not None, fit on the centers of the nonempty bins of bin2d(x, y, bins, log_scale),
+        weighted by their counts, which is the data shown by scatter2d's density modes.
+        It is used for fitting only, and the fit curve is passed to plot2d without binning.
+    :param log_scale: bool
+        refer to bin2d
+    :param kwargs: key words for plot2d except bins
     """
-    p = polyfit(x, y, deg)
-    x_fit = np.unique(sorted(x))
+    if bins is None:
+        p = polyfit(x, y, deg)
+        x_fit = np.unique(x)
+    else:
+        counts, x_edges, y_edges = bin2d(x, y, bins, log_scale)
+        if log_scale:
+            x_centers, y_centers = np.sqrt(x_edges[:-1] * x_edges[1:]), np.sqrt(y_edges[:-1] * y_edges[1:])
+        else:
+            x_centers, y_centers = (x_edges[:-1] + x_edges[1:]) / 2, (y_edges[:-1] + y_edges[1:]) / 2
+        x_ind, y_ind = np.nonzero(counts)
+        # polyfit's weights multiply the residuals, so counts are square-rooted
+        p = polyfit(x_centers[x_ind], y_centers[y_ind], deg, w=np.sqrt(counts[x_ind, y_ind]))
+        x_fit = x_centers[np.unique(x_ind)]
     y_fit = p[deg]
     for idx in range(deg):
         y_fit += p[idx] * x_fit ** (deg - idx)
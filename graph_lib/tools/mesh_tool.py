@@ -1,12 +1,17 @@
 # emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
 # vi: set ft=python sts=4 ts=4 sw=4 et:
 
+from functools import partial
+from heapq import heappop, heappush
+
 import numpy as np
 from scipy import sparse
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import pdist
-from scipy.stats import pearsonr
 from networkx import Graph
 
+from graph_lib import instrument
+
 
 # --------------------------------get information from mesh--------------------------
 def mesh_edges(faces):
@@ -88,9 +93,386 @@ def get_n_ring_neighbor(faces, n=1, ordinal=False):
         return n_ring_neighbors
 
 
+def get_n_ring_block(csr_adj, start, stop, n=1, ordinal=False):
+    """
+    get n ring neighbors of the vertices in [start, stop) as an edge list
+    It uses sparse matrix products, so only the block's neighbors are held in memory.
+    :param csr_adj: csr matrix
+        binary 1 ring adjacent matrix of the mesh with dtype int32.
+        It is shared by all blocks, so convert it only once, such as:
+            csr_adj = mesh_edges(faces).tocsr().astype(np.int32)
+            csr_adj.data[:] = 1
+    :param start: integer
+        the first vertex of the block
+    :param stop: integer
+        the vertex after the last vertex of the block
+    :param n: integer
+        specify which ring should be got
+    :param ordinal: bool
+        True: get the n_th ring neighbor
+        False: get the n ring neighbor
+    :return: (rows, cols)
+        numpy arrays, each (rows[i], cols[i]) is a vertex and one of its neighbors
+    """
+    if n < 1:
+        raise RuntimeError("The number of rings should be equal or greater than 1!")
+
+    n_vtx = csr_adj.shape[0]
+    # reach[i, j] is nonzero if vertex j is within k rings of vertex i+start
+    reach = sparse.eye(stop-start, n_vtx, k=start, dtype=np.int32, format='csr')
+    inner = reach
+    for _ in range(n):
+        inner = reach
+        reach = reach + reach.dot(csr_adj)
+        reach.data[:] = 1  # keep path counts from growing
+    if not ordinal:
+        # only remove the vertex itself
+        inner = sparse.eye(stop-start, n_vtx, k=start, dtype=np.int32, format='csr')
+    ring = reach - inner
+    ring.eliminate_zeros()
+    ring = ring.tocoo()
+
+    return ring.row + start, ring.col
+
+
+def mesh_edge_lengths(faces, coords):
+    """
+    get the lengths of the mesh's edges
+    :param faces: the array of shape [n_triangles, 3]
+    :param coords: the array of shape [n_vertices, 3]
+        vertices' coordinates
+    :return: csr matrix
+        csr_dist[i, j] is the euclidean length of the edge joining i to j
+    """
+    coo_w = mesh_edges(faces)
+    coords = np.asarray(coords)
+    lengths = np.sqrt(np.sum((coords[coo_w.row] - coords[coo_w.col]) ** 2, axis=1))
+    return sparse.csr_matrix((lengths, (coo_w.row, coo_w.col)), coo_w.shape)
+
+
+def get_euclidean_block(tree, start, stop, radius):
+    """
+    get neighbors within euclidean radius of the vertices in [start, stop) as an edge list
+    :param tree: cKDTree
+        the tree built from vertices' coordinates
+    :param start: integer
+        the first vertex of the block
+    :param stop: integer
+        the vertex after the last vertex of the block
+    :param radius: float
+        the maximal euclidean distance between a vertex and its neighbors
+    :return: (rows, cols)
+        numpy arrays, each (rows[i], cols[i]) is a vertex and one of its neighbors
+    """
+    neighbors = tree.query_ball_point(tree.data[start:stop], radius)
+    counts = [len(i) for i in neighbors]
+    rows = np.repeat(np.arange(start, stop), counts)
+    cols = np.fromiter((v_id for i in neighbors for v_id in i), np.int64, sum(counts))
+    mask = rows != cols  # remove the vertex itself
+    return rows[mask], cols[mask]
+
+
+def get_geodesic_block(csr_dist, start, stop, radius):
+    """
+    get neighbors within geodesic radius of the vertices in [start, stop) as an edge list
+    The geodesic distance is approximated by the shortest path along the mesh's edges,
+    which is calculated by Dijkstra's algorithm stopping at the radius. Only the vertices
+    within the radius are visited, so the memory and time grow with the number of neighbors
+    rather than the number of vertices.
+    :param csr_dist: csr matrix
+        the mesh's edge lengths, such as mesh_edge_lengths(faces, coords)
+    :param start: integer
+        the first vertex of the block
+    :param stop: integer
+        the vertex after the last vertex of the block
+    :param radius: float
+        the maximal geodesic distance between a vertex and its neighbors
+    :return: (rows, cols)
+        numpy arrays, each (rows[i], cols[i]) is a vertex and one of its neighbors
+    """
+    indptr, indices, data = csr_dist.indptr, csr_dist.indices, csr_dist.data
+    rows_list, cols_list = [], []
+    for vtx in range(start, stop):
+        dist = {vtx: 0.0}
+        visited = set()
+        heap = [(0.0, vtx)]
+        while heap:
+            d, v = heappop(heap)
+            if v in visited:
+                continue
+            visited.add(v)
+            begin, end = indptr[v], indptr[v+1]
+            for u, length in zip(indices[begin:end].tolist(), data[begin:end].tolist()):
+                d_new = d + length
+                if d_new <= radius and d_new < dist.get(u, np.inf):
+                    dist[u] = d_new
+                    heappush(heap, (d_new, u))
+        visited.remove(vtx)  # remove the vertex itself
+        rows_list.append(np.full(len(visited), vtx, np.int64))
+        cols_list.append(np.fromiter(visited, np.int64, len(visited)))
+    return np.concatenate(rows_list), np.concatenate(cols_list)
+
+
 # ---------------------transform mesh to graph-related data structure----------------
+# vectorized counterparts of scipy.spatial.distance metrics, applied to row pairs
+_DISSIMILAR_FUNCS = {
+    'euclidean': lambda a, b: np.sqrt(np.sum((a - b) ** 2, axis=1)),
+    'sqeuclidean': lambda a, b: np.sum((a - b) ** 2, axis=1),
+    'cityblock': lambda a, b: np.sum(np.abs(a - b), axis=1),
+    'chebyshev': lambda a, b: np.max(np.abs(a - b), axis=1),
+    'cosine': lambda a, b: 1 - np.sum(a * b, axis=1) / np.sqrt(np.sum(a ** 2, axis=1) * np.sum(b ** 2, axis=1)),
+}
+
+
+def _check_weight_type(weight_type):
+    if weight_type[0] == 'dissimilar':
+        return
+    if weight_type[0] == 'similar' and weight_type[1] == 'pearson correlation':
+        return
+    raise TypeError("The weight_type-{} is not supported now!".format(weight_type))
+
+
+def _edge_weights(vtx_signal, rows, cols, weight_type, max_elements=2**24):
+    """
+    calculate weights of the edges zip(rows, cols) according to vertices' signal
+    Edges are processed in batches of at most max_elements signal values at a time.
+    If weight_type is ('similar', 'pearson correlation'), vtx_signal should
+    have been z-scored along the measurement axis by _zscore_rows().
+    """
+    n_edge = len(rows)
+    weights = np.empty(n_edge)
+    batch_size = max(1, max_elements // max(1, vtx_signal.shape[1]))
+    for i in range(0, n_edge, batch_size):
+        r = rows[i:i+batch_size]
+        c = cols[i:i+batch_size]
+        if weight_type[0] == 'dissimilar':
+            func = _DISSIMILAR_FUNCS.get(weight_type[1])
+            if func is None:
+                weights[i:i+batch_size] = [pdist(np.c_[vtx_signal[r_i], vtx_signal[c_i]].T,
+                                                 metric=weight_type[1])[0] for r_i, c_i in zip(r, c)]
+            else:
+                weights[i:i+batch_size] = func(vtx_signal[r], vtx_signal[c])
+        else:
+            weights[i:i+batch_size] = np.mean(vtx_signal[r] * vtx_signal[c], axis=1)
+    return weights
+
+
+def _zscore_rows(vtx_signal):
+    signal = np.asarray(vtx_signal, dtype=np.float64)
+    signal = signal - np.mean(signal, axis=1, keepdims=True)
+    return signal / np.std(signal, axis=1, keepdims=True)
+
+
+def prune_edges(rows, cols, weights, thr=None, top_k=None, similar=True, quantile=None):
+    """
+    sparsify an edge list by keeping the most related edges
+
+    Parameters
+    ----------
+    rows : numpy array
+    cols : numpy array
+    weights : numpy array
+    thr : float
+        If it is not None, keep edges whose weight >= thr (similar is True)
+        or weight <= thr (similar is False).
+    top_k : integer
+        If it is not None, keep each row's top_k most related edges.
+        All edges of a row are supposed to be in the given edge list.
+    similar : bool
+        True: greater the weight is, two vertices of the edge are more related.
+        False: smaller the weight is, two vertices of the edge are more related.
+    quantile : float
+        If it is not None, keep edges which are at least as related as
+        the given quantile (in [0, 1]) of all the given edges.
+
+    Returns
+    -------
+    (rows, cols, weights) : the kept edges
+    """
+    # turn weights into keys which are greater for more related edges
+    key = weights if similar else -weights
+    if thr is not None:
+        mask = key >= (thr if similar else -thr)
+        rows, cols, weights, key = rows[mask], cols[mask], weights[mask], key[mask]
+
+    if quantile is not None and len(rows):
+        kth = int(quantile * (len(key) - 1))
+        # partition is linear in time, whereas sort is not
+        mask = key >= np.partition(key, kth)[kth]
+        rows, cols, weights, key = rows[mask], cols[mask], weights[mask], key[mask]
+
+    if top_k is not None and len(rows):
+        if np.any(np.diff(rows) < 0):
+            order = np.argsort(rows, kind='mergesort')
+            rows, cols, weights, key = rows[order], cols[order], weights[order], key[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(rows)) + 1]
+        counts = np.diff(np.r_[starts, len(rows)])
+        max_count = np.max(counts)
+        if max_count > top_k:
+            # lay each row's keys out in a padded block, so that the top_k
+            # of all rows can be selected by a single argpartition
+            group = np.repeat(np.arange(len(starts)), counts)
+            pos = np.arange(len(rows)) - np.repeat(starts, counts)
+            key_block = np.full((len(starts), max_count), -np.inf)
+            key_block[group, pos] = key
+            top_pos = np.argpartition(-key_block, top_k-1, axis=1)[:, :top_k]
+            keep_block = np.zeros(key_block.shape, dtype=bool)
+            keep_block[np.arange(len(starts))[:, None], top_pos] = True
+            mask = keep_block[group, pos]
+            rows, cols, weights = rows[mask], cols[mask], weights[mask]
+
+    return rows, cols, weights
+
+
+def mesh2edge_chunks(faces, n=1, ordinal=False, vtx_signal=None,
+                     weight_type=('dissimilar', 'euclidean'), chunk_size=5000, thr=None, top_k=None,
+                     neighborhood='ring', coords=None, radius=None, stats=None):
+    """
+    generate edge list chunk by chunk according to mesh's geometry and vtx_signal
+    Each chunk includes all edges of a block of chunk_size vertices,
+    so the memory in use is bounded by the chunk size rather than the mesh size.
+
+    Parameters
+    ----------
+    faces : a array with shape (n_triangles, 3)
+    n : integer
+        specify which ring should be got
+    ordinal : bool
+        True: get the n_th ring neighbor
+        False: get the n ring neighbor
+    vtx_signal : numpy array
+        NxM array, N is the number of vertices,
+        M is the number of measurements and time points.
+    weight_type : (str1, str2)
+        The rule used for calculating weights
+        such as ('dissimilar', 'euclidean') and ('similar', 'pearson correlation')
+    chunk_size : integer
+        the number of vertices whose edges are generated at a time
+    thr : float
+        If it is not None, prune weights per chunk. Refer to prune_edges.
+        NOTE: weights aren't normalized at this stage.
+    top_k : integer
+        If it is not None, keep each vertex's top_k most related neighbors.
+        Refer to prune_edges.
+    neighborhood : str
+        The rule used for finding neighbors.
+        'ring': n ring neighbors, specified by n and ordinal
+        'euclidean': neighbors within euclidean radius, found by a KD-tree
+        'geodesic': neighbors within geodesic radius, found by bounded Dijkstra along mesh's edges
+        n and ordinal are ignored by the latter two, which need coords and radius.
+        Their edge counts are proportional to the area within the radius
+        no matter how uneven the vertex density is.
+    coords : numpy array
+        Nx3 array, vertices' coordinates
+    radius : float
+        the radius of the neighborhood
+    stats : dict
+        If it is not None, accumulate the number of candidate edges into stats['n_edge']
+        and the number of edges left after pruning into stats['n_kept'].
+
+    Yields
+    ------
+    (rows, cols, weights) : numpy arrays
+        row indices, column indices and weights of the chunk's edges
+    """
+    if vtx_signal is not None:
+        _check_weight_type(weight_type)
+        if weight_type[0] == 'similar':
+            vtx_signal = _zscore_rows(vtx_signal)
+        else:
+            vtx_signal = np.asarray(vtx_signal)
+    similar = vtx_signal is None or weight_type[0] == 'similar'
+
+    if neighborhood in ('euclidean', 'geodesic'):
+        n_vtx = np.max(faces) + 1
+        if coords is None or np.ndim(coords) != 2 or len(coords) != n_vtx:
+            raise ValueError("The neighborhood-{} needs coords with shape ({}, n_dim)!".format(neighborhood, n_vtx))
+        if radius is None or radius < 0:
+            raise ValueError("The neighborhood-{} needs a non-negative radius!".format(neighborhood))
+
+    if neighborhood == 'ring':
+        # binarize the adjacent matrix once rather than per block
+        csr_adj = mesh_edges(faces).tocsr().astype(np.int32)
+        csr_adj.data[:] = 1
+        get_block = partial(get_n_ring_block, csr_adj, n=n, ordinal=ordinal)
+    elif neighborhood == 'euclidean':
+        get_block = partial(get_euclidean_block, cKDTree(coords), radius=radius)
+    elif neighborhood == 'geodesic':
+        get_block = partial(get_geodesic_block, mesh_edge_lengths(faces, coords), radius=radius)
+    else:
+        raise ValueError('The neighborhood-{} is not supported now!'.format(neighborhood))
+
+    n_vtx = np.max(faces) + 1
+    for start in range(0, n_vtx, chunk_size):
+        stop = min(start+chunk_size, n_vtx)
+        # the stage is closed before yielding, so that it excludes the consumer's time
+        with instrument.stage('mesh_block', start=start, stop=stop) as block_stage:
+            with instrument.stage('neighbors', neighborhood=neighborhood):
+                rows, cols = get_block(start, stop)
+            with instrument.stage('edge_weights'):
+                if vtx_signal is None:
+                    # create unweighted edges
+                    weights = np.ones(len(rows))
+                else:
+                    weights = _edge_weights(vtx_signal, rows, cols, weight_type)
+            n_edge = len(rows)
+            if thr is not None or top_k is not None:
+                with instrument.stage('prune_edges'):
+                    rows, cols, weights = prune_edges(rows, cols, weights, thr, top_k, similar)
+            block_stage.update(n_edge=n_edge, n_kept=len(rows))
+        if stats is not None:
+            stats['n_edge'] = stats.get('n_edge', 0) + n_edge
+            stats['n_kept'] = stats.get('n_kept', 0) + len(rows)
+        yield rows, cols, weights
+
+
+def concatenate_edge_chunks(edge_chunks, index_dtype=np.int64):
+    """
+    concatenate edge chunks into arrays while consuming them
+    The arrays grow in place by ndarray.resize (realloc), so the chunks and
+    a concatenated copy of them are never held in memory at the same time.
+    :param edge_chunks: iterable
+        each element is (rows, cols, weights), such as the chunks generated by mesh2edge_chunks
+    :param index_dtype: numpy dtype
+        the dtype of rows and cols
+    :return: (rows, cols, weights)
+        numpy arrays with dtype index_dtype, index_dtype and float64
+    """
+    rows = np.empty(0, index_dtype)
+    cols = np.empty(0, index_dtype)
+    weights = np.empty(0, np.float64)
+    n_edge = 0
+    for chunk_rows, chunk_cols, chunk_weights in edge_chunks:
+        stop = n_edge + len(chunk_rows)
+        if stop > len(rows):
+            # grow geometrically to keep the number of reallocations logarithmic
+            capacity = max(stop, len(rows) * 3 // 2)
+            for arr in (rows, cols, weights):
+                arr.resize(capacity, refcheck=False)
+        rows[n_edge:stop] = chunk_rows
+        cols[n_edge:stop] = chunk_cols
+        weights[n_edge:stop] = chunk_weights
+        n_edge = stop
+    for arr in (rows, cols, weights):
+        arr.resize(n_edge, refcheck=False)
+    return rows, cols, weights
+
+
+def _normalize_weights(weights, w_min, w_max, weight_type):
+    """
+    normalize weights to [0, 1] given the minimum and maximum of all weights
+    After doing this, greater the weight is, two vertices of the edge are more related.
+    """
+    if weight_type[0] == 'dissimilar':
+        return (w_max - weights) / (w_max - w_min)
+    else:
+        return (weights - w_min) / (w_max - w_min)
+
+
 def mesh2edge_list(faces, n=1, ordinal=False, vtx_signal=None,
-                   weight_type=('dissimilar', 'euclidean'), weight_normalization=False):
+                   weight_type=('dissimilar', 'euclidean'), weight_normalization=False,
+                   chunk_size=5000, thr=None, top_k=None,
+                   neighborhood='ring', coords=None, radius=None, quantile=None, stats=None):
     """
     get edge_list according to mesh's geometry and vtx_signal
     The edge_list can be used to create graph or adjacent matrix
@@ -113,53 +495,60 @@ def mesh2edge_list(faces, n=1, ordinal=False, vtx_signal=None,
         If it is False, do nothing.
         If it is True, normalize weights to [0, 1].
             After doing this, greater the weight is, two vertices of the edge are more related.
+    chunk_size, thr, top_k, neighborhood, coords, radius :
+        Refer to mesh2edge_chunks
+    quantile : float
+        If it is not None, keep edges which are at least as related as
+        the quantile of all edges' weights. Refer to prune_edges.
+    stats : dict
+        If it is not None, it is filled with the number of candidate edges 'n_edge',
+        the number of kept edges 'n_kept' and their ratio 'kept_fraction'.
 
     Returns
     -------
-    row_ind : list
+    row_ind : numpy array
         row indices of edges
-    col_ind : list
+    col_ind : numpy array
         column indices of edges
-    edge_data : list
+    edge_data : numpy array
         edge data of the edges-zip(row_ind, col_ind)
+        If top_k is not None, the edges are symmetrized by keeping an edge
+        which is among the top_k of either of its vertices, in both directions.
     """
-
-    n_ring_neighbors = get_n_ring_neighbor(faces, n, ordinal)
-
-    row_ind = [i for i, neighbors in enumerate(n_ring_neighbors) for v_id in neighbors]
-    col_ind = [v_id for neighbors in n_ring_neighbors for v_id in neighbors]
-    if vtx_signal is None:
-        # create unweighted edges
-        n_edge = len(row_ind)  # the number of edges
-        edge_data = np.ones(n_edge)
-    else:
-        # calculate weights according to mesh's geometry and vertices' signal
-        if weight_type[0] == 'dissimilar':
-            edge_data = [pdist(np.c_[vtx_signal[i], vtx_signal[j]].T,
-                               metric=weight_type[1])[0] for i, j in zip(row_ind, col_ind)]
-
-            if weight_normalization:
-                max_dissimilar = np.max(edge_data)
-                min_dissimilar = np.min(edge_data)
-                edge_data = [(max_dissimilar-dist)/(max_dissimilar-min_dissimilar) for dist in edge_data]
-        elif weight_type[0] == 'similar':
-            if weight_type[1] == 'pearson correlation':
-                edge_data = [pearsonr(vtx_signal[i], vtx_signal[j])[0] for i, j in zip(row_ind, col_ind)]
-            else:
-                raise TypeError("The weight_type-{} is not supported now!".format(weight_type))
-
-            if weight_normalization:
-                max_similar = np.max(edge_data)
-                min_similar = np.min(edge_data)
-                edge_data = [(simi-min_similar)/(max_similar-min_similar) for simi in edge_data]
-        else:
-            raise TypeError("The weight_type-{} is not supported now!".format(weight_type))
+    if stats is None:
+        stats = dict()
+    edge_chunks = mesh2edge_chunks(faces, n, ordinal, vtx_signal, weight_type,
+                                   chunk_size, thr, top_k, neighborhood, coords, radius, stats)
+    # the same index dtype as scipy.sparse uses, so that matrices don't copy the indices
+    index_dtype = np.int32 if np.max(faces) < np.iinfo(np.int32).max else np.int64
+    row_ind, col_ind, edge_data = concatenate_edge_chunks(edge_chunks, index_dtype)
+
+    if quantile is not None:
+        # the quantile is taken over all edges, so it is applied after all chunks are collected
+        similar = vtx_signal is None or weight_type[0] == 'similar'
+        row_ind, col_ind, edge_data = prune_edges(row_ind, col_ind, edge_data,
+                                                  similar=similar, quantile=quantile)
+    if top_k is not None:
+        # take the union of the two directions from the sparsity pattern, as weights are symmetric.
+        # Comparing weights (e.g. maximum with the transpose) would drop non-positive ones.
+        n_vtx = np.max(faces) + 1
+        row_ind, col_ind = np.r_[row_ind, col_ind], np.r_[col_ind, row_ind]
+        edge_data = np.r_[edge_data, edge_data]
+        _, uniq_ind = np.unique(row_ind.astype(np.int64) * n_vtx + col_ind, return_index=True)
+        row_ind, col_ind, edge_data = row_ind[uniq_ind], col_ind[uniq_ind], edge_data[uniq_ind]
+    stats['n_kept'] = len(row_ind)
+    stats['kept_fraction'] = float(stats['n_kept']) / max(1, stats.get('n_edge', 0))
+
+    if vtx_signal is not None and weight_normalization:
+        edge_data = _normalize_weights(edge_data, np.min(edge_data), np.max(edge_data), weight_type)
 
     return row_ind, col_ind, edge_data
 
 
 def mesh2adjacent_matrix(faces, n=1, ordinal=False, vtx_signal=None,
-                         weight_type=('dissimilar', 'euclidean'), weight_normalization=False):
+                         weight_type=('dissimilar', 'euclidean'), weight_normalization=False,
+                         chunk_size=5000, thr=None, top_k=None,
+                         neighborhood='ring', coords=None, radius=None, quantile=None, stats=None):
     """
     get adjacent matrix according to mesh's geometry and vtx_signal
 
@@ -181,24 +570,41 @@ def mesh2adjacent_matrix(faces, n=1, ordinal=False, vtx_signal=None,
         If it is False, do nothing.
         If it is True, normalize weights to [0, 1].
             After doing this, greater the weight is, two vertices of the edge are more related.
+    chunk_size, thr, top_k, neighborhood, coords, radius :
+        Refer to mesh2edge_chunks
+    quantile : float
+        If it is not None, keep edges which are at least as related as
+        the quantile of all edges' weights. Refer to prune_edges.
+    stats : dict
+        If it is not None, it is filled with the number of candidate edges 'n_edge',
+        the number of kept edges 'n_kept' and their ratio 'kept_fraction'.
 
     Returns
     -------
     adjacent_matrix : coo matrix
+        If top_k is not None, it is symmetrized by keeping an edge
+        which is among the top_k of either of its vertices. Refer to mesh2edge_list.
     """
 
+    if stats is None:
+        stats = dict()
     n_vtx = np.max(faces) + 1
     row_ind, col_ind, edge_data = mesh2edge_list(faces, n, ordinal, vtx_signal,
-                                                 weight_type, weight_normalization)
+                                                 weight_type, weight_normalization,
+                                                 chunk_size, thr, top_k,
+                                                 neighborhood, coords, radius, quantile, stats)
     adjacent_matrix = sparse.coo_matrix((edge_data, (row_ind, col_ind)), (n_vtx, n_vtx))
 
     return adjacent_matrix
 
 
 def mesh2graph(faces, n=1, ordinal=False, vtx_signal=None,
-               weight_type=('dissimilar', 'euclidean'), weight_normalization=False):
+               weight_type=('dissimilar', 'euclidean'), weight_normalization=False,
+               chunk_size=5000, thr=None, top_k=None,
+               neighborhood='ring', coords=None, radius=None, quantile=None, stats=None):
     """
     create graph according to mesh's geometry and vtx_signal
+    Edges are added chunk by chunk, so the whole edge list is never materialized.
 
     Parameters
     ----------
@@ -218,19 +624,57 @@ def mesh2graph(faces, n=1, ordinal=False, vtx_signal=None,
         If it is False, do nothing.
         If it is True, normalize weights to [0, 1].
             After doing this, greater the weight is, two vertices of the edge are more related.
+    chunk_size, thr, top_k, neighborhood, coords, radius :
+        Refer to mesh2edge_chunks
+    quantile : float
+        If it is not None, keep edges which are at least as related as
+        the quantile of all edges' weights. Refer to prune_edges.
+        NOTE: Sparsifying by top_k or quantile doesn't always speed up segmentation
+        such as graph2parcel. Fewer edges make each matrix-vector product cheaper,
+        but they can weaken the graph's cluster structure, so that the eigensolver
+        needs more iterations and takes longer on the whole. It helps the most
+        when the signal has clear regions and the dense neighborhood is large.
+    stats : dict
+        If it is not None, it is filled with the number of candidate edges 'n_edge',
+        the number of kept edges 'n_kept' and their ratio 'kept_fraction'.
 
     Returns
     -------
     graph : nx.Graph
+        An edge is kept if it is kept for either of its vertices,
+        so the graph is the symmetrized result of top_k pruning.
     """
 
-    row_ind, col_ind, edge_data = mesh2edge_list(faces, n, ordinal, vtx_signal,
-                                                 weight_type, weight_normalization)
+    if stats is None:
+        stats = dict()
+    if quantile is None:
+        edge_chunks = mesh2edge_chunks(faces, n, ordinal, vtx_signal, weight_type, chunk_size,
+                                       thr, top_k, neighborhood, coords, radius, stats)
+    else:
+        # the quantile needs all weights at once, so edges can't be consumed chunk by chunk
+        edge_chunks = [mesh2edge_list(faces, n, ordinal, vtx_signal, weight_type, False, chunk_size,
+                                      thr, top_k, neighborhood, coords, radius, quantile, stats)]
+
     graph = Graph()
-    # add_weighted_edges_from is faster than from_scipy_sparse_matrix and from_numpy_matrix
-    # add_weighted_edges_from is also faster than default constructor
-    # To get more related information, please refer to
-    # http://stackoverflow.com/questions/24681677/transform-csr-matrix-into-networkx-graph
-    graph.add_weighted_edges_from(zip(row_ind, col_ind, edge_data))
+    w_min, w_max = np.inf, -np.inf
+    for rows, cols, weights in edge_chunks:
+        if len(weights):
+            w_min = min(w_min, np.min(weights))
+            w_max = max(w_max, np.max(weights))
+        # add_weighted_edges_from is faster than from_scipy_sparse_matrix and from_numpy_matrix
+        # add_weighted_edges_from is also faster than default constructor
+        # To get more related information, please refer to
+        # http://stackoverflow.com/questions/24681677/transform-csr-matrix-into-networkx-graph
+        with instrument.stage('add_edges', n_edge=len(rows)):
+            graph.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), weights.tolist()))
+
+    if vtx_signal is not None and weight_normalization:
+        # the minimum and maximum are known only after all chunks are consumed
+        for _, _, data in graph.edges_iter(data=True):
+            data['weight'] = _normalize_weights(data['weight'], w_min, w_max, weight_type)
+
+    # count both directions of each edge to be comparable with stats['n_edge']
+    stats['n_kept'] = 2 * graph.number_of_edges()
+    stats['kept_fraction'] = float(stats['n_kept']) / max(1, stats.get('n_edge', 0))
 
     return graph